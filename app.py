@@ -3,16 +3,43 @@
 # Python 3.8+; deps: streamlit, requests, pandas, plotly
 
 from __future__ import annotations
+import functools
+import hashlib
+import json
 import math
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import streamlit as st
 import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.subplots import make_subplots
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+try:  # optional: 2-4x faster parsing of large WDI/SDMX payloads
+    import orjson as _json
+    # st.plotly_chart serializes via plotly.io.to_json; pin its encoder to orjson too
+    pio.json.config.default_engine = "orjson"
+except ImportError:
+    _json = None
+
+try:  # optional (ships with streamlit): native multi-threaded CSV writer
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
 
 # ------------------------------------------------------------
 # Page meta
@@ -37,11 +64,13 @@ COUNTRY_LABELS: Dict[str, str] = {
     "TUR": "Türkiye", "GBR": "United Kingdom", "DEU": "Germany", "FRA": "France",
     "JPN": "Japan", "VNM": "Vietnam",
 }
+_COUNTRY_LABELS_SER = pd.Series(COUNTRY_LABELS)  # vectorized iso3 → label lookup in wb_fetch
 PEER_PRESETS: Dict[str, List[str]] = {
     "SAARC": ["BGD", "PAK", "LKA", "NPL"],
     "BRICS": ["BRA", "RUS", "CHN", "ZAF"],
     "G20 sample": ["USA", "CHN", "JPN", "DEU", "GBR", "FRA"],
 }
+ALL_PEERS: List[str] = sorted(set(chain.from_iterable(PEER_PRESETS.values())) | {"USA","CHN","BRA","ZAF","IDN","VNM"})
 
 SDG_NAMES = {
     1: "No Poverty", 2: "Zero Hunger", 3: "Good Health & Well-Being", 4: "Quality Education",
@@ -61,6 +90,20 @@ def sdg_icon_url(goal: int, language: str = "en", high_contrast: bool = False) -
     base = "https://open-sdg.github.io/sdg-translations/assets/img"
     return f"{base}/{'high-contrast/' if high_contrast else ''}goals/{language}/{goal}.png"
 
+# Goal label ("SDG n · Name") → goal number, and goal number → icon URL, built once at import
+SDG_NO_BY_LABEL: Dict[str, int] = {f"SDG {n} · {name}": n for n, name in SDG_NAMES.items()}
+SDG_ICON_URL: Dict[int, str] = {n: sdg_icon_url(n) for n in SDG_NAMES}
+SDG_ICON_DIR = Path("assets/sdg")  # optional bundled icons: assets/sdg/<n>.png
+
+@st.cache_data(show_spinner=False)
+def sdg_icon(goal: int):
+    """Bundled icon bytes when assets/sdg/<goal>.png exists (no external fetch), else the CDN URL."""
+    path = SDG_ICON_DIR / f"{goal}.png"
+    try:
+        return path.read_bytes()
+    except OSError:
+        return SDG_ICON_URL.get(goal) or sdg_icon_url(goal)
+
 # ------------------------------------------------------------
 # Data-driven SDG catalogue for WDI subset
 # ------------------------------------------------------------
@@ -96,139 +139,327 @@ def load_sdg_catalogue() -> pd.DataFrame:
         return df
     return _fallback_catalogue()
 
+@st.cache_data(show_spinner=False, ttl=None)
+def _catalog_by_goal(df_catalog: pd.DataFrame) -> Dict[int, List[Dict[str, object]]]:
+    """Goal number → catalogue records (sorted by target, label); one groupby instead of a mask per call."""
+    return {
+        int(g): sub.sort_values(["target", "series_label"])
+                   .assign(target2030=pd.to_numeric(sub["target2030"], errors="coerce"))
+                   .to_dict("records")
+        for g, sub in df_catalog.groupby("goal")
+    }
+
 def indicators_for_goal(df_catalog: pd.DataFrame, goal_label: str) -> List[Dict[str, object]]:
     try:
         goal_no = int(goal_label.split()[1])
     except Exception:
         goal_no = 1
-    rows = df_catalog[df_catalog["goal"] == goal_no].sort_values(["target", "series_label"])
-    out: List[Dict[str, object]] = []
-    for _, r in rows.iterrows():
-        out.append({
+    return [
+        {
             "code": r["wb_code"],                      # may be blank if not in WDI
             "name": r["series_label"],
             "better": r["better"] or "up",
             "target2030": None if pd.isna(r["target2030"]) else r["target2030"],
             "unit": r["unit"],
             "target": r["target"],
-        })
-    return out
+        }
+        for r in _catalog_by_goal(df_catalog).get(goal_no, [])
+    ]
+
+@st.cache_data(show_spinner=False, ttl=None)
+def indicators_for_goal_cached(goal_label: str) -> Tuple[Dict[str, object], ...]:
+    """indicators_for_goal memoized per goal label across reruns (treat the dicts as read-only)."""
+    return tuple(indicators_for_goal(load_sdg_catalogue(), goal_label))
 
 # ------------------------------------------------------------
 # World Bank API helpers (cached + retry)
 # ------------------------------------------------------------
 WB_BASE = "https://api.worldbank.org/v2"
 
-def _safe_get(url: str, params: dict, retries: int = 3, backoff: float = 0.6):
-    last_exc = None
-    for i in range(retries):
+# One pooled session for every WB/UN call: keep-alive skips the TCP+TLS handshake per request,
+# and the adapter retries connect errors / 429 / 5xx for every call site. Read timeouts are not
+# retried, so an unresponsive endpoint costs one timeout rather than four.
+_RETRY = Retry(total=3, read=0, backoff_factor=0.6, status_forcelist=(429, 500, 502, 503, 504),
+               raise_on_status=False)
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=_RETRY))
+
+def _json_loads(resp: requests.Response):
+    """Parse a response body with orjson when installed, else requests' stdlib json."""
+    return _json.loads(resp.content) if _json else resp.json()
+
+def _executor(max_workers: int = 8) -> ThreadPoolExecutor:
+    """Thread pool for independent HTTP calls; workers inherit the script context (cache/no warnings)."""
+    ctx = get_script_run_ctx()
+    return ThreadPoolExecutor(max_workers=max_workers,
+                              initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx))
+
+def _safe_get(url: str, params: dict):
+    """GET with the session's retry policy; raises on a final non-2xx."""
+    r = _SESSION.get(url, params=params, timeout=30)
+    r.raise_for_status()
+    return r
+
+# Second-level on-disk cache (Parquet) so fetched series survive process restarts/redeploys
+WB_DISK_CACHE = Path(".cache/wdi")
+WB_DISK_TTL = 3600
+WB_DISK_SCHEMA = 2  # part of the file key; bump when wb_fetch's column dtypes change
+
+def _parquet_cache_get(path: Path, ttl: int) -> Optional[pd.DataFrame]:
+    """Fresh cached frame or None; an expired file is deleted on the way."""
+    try:
+        if path.exists():
+            if time.time() - path.stat().st_mtime < ttl:
+                return pd.read_parquet(path)
+            path.unlink(missing_ok=True)
+    except Exception:
+        pass
+    return None
+
+def _parquet_cache_put(path: Path, df: pd.DataFrame, ttl: int = WB_DISK_TTL) -> None:
+    """Best-effort write via atomic rename; silently skipped without pyarrow or on read-only disks.
+    Also prunes expired siblings, since keys (peers × year window) that are never revisited would
+    otherwise pile up."""
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")  # unique across workers/threads
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(tmp, compression="zstd", index=False)
+        tmp.replace(path)
+        cutoff = time.time() - ttl
+        for old in path.parent.glob("*.parquet"):
+            try:
+                if old.stat().st_mtime < cutoff:
+                    old.unlink()
+            except OSError:
+                pass
+    except Exception:
         try:
-            r = requests.get(url, params=params, timeout=30)
-            r.raise_for_status()
-            return r
-        except Exception as e:
-            last_exc = e
-            time.sleep(backoff * (2 ** i))
-    raise last_exc
+            tmp.unlink(missing_ok=True)  # don't orphan a partial write (the prune only globs *.parquet)
+        except OSError:
+            pass
+
+# Same idea for (static) indicator/hierarchy metadata, stored as JSON
+META_DISK_CACHE = Path(".cache/meta")
+META_DISK_TTL = 86400
+
+def _json_disk_cache(namespace: str, ttl: int = META_DISK_TTL):
+    """Decorator: persist a JSON-serialisable result under META_DISK_CACHE/namespace.
+    Sits beneath @st.cache_data so cold processes reuse prior fetches; empty results are not stored."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            key = hashlib.md5(json.dumps(args, default=str).encode()).hexdigest()
+            path = META_DISK_CACHE / namespace / f"{key}.json"
+            try:
+                if path.exists() and time.time() - path.stat().st_mtime < ttl:
+                    return json.loads(path.read_bytes())
+            except Exception:
+                pass
+            out = fn(*args)
+            if out:
+                tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                try:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    tmp.write_text(json.dumps(out))
+                    tmp.replace(path)
+                except Exception:
+                    try:
+                        tmp.unlink(missing_ok=True)
+                    except OSError:
+                        pass
+            return out
+        return wrapper
+    return deco
 
 @st.cache_data(show_spinner=False, ttl=3600)
-def wb_fetch(indicator: str, iso3_list: List[str]) -> pd.DataFrame:
-    """Fetch indicator for a ; separated list of countries."""
-    countries = ";".join(iso3_list)
+def wb_fetch(indicator: str, iso3_list: Tuple[str, ...],
+             yr1: Optional[int] = None, yr2: Optional[int] = None) -> pd.DataFrame:
+    """Fetch indicator for a ; separated list of countries (tuple keeps the cache key hashable).
+    When both yr1/yr2 are given the year window is applied query-side (`date=yr1:yr2`)."""
+    key = hashlib.md5((indicator + "|" + ";".join(sorted(iso3_list))
+                       + f"|{yr1}:{yr2}|v{WB_DISK_SCHEMA}").encode()).hexdigest()
+    disk_path = WB_DISK_CACHE / f"{key}.parquet"
+    cached = _parquet_cache_get(disk_path, WB_DISK_TTL)
+    if cached is not None:
+        return cached
+
+    countries = ";".join(list(iso3_list))
     url = f"{WB_BASE}/country/{countries}/indicator/{indicator}"
     params = {"format": "json", "per_page": 20000}
-    rows: List[Dict[str, object]] = []
+    if yr1 is not None and yr2 is not None:
+        params["date"] = f"{yr1}:{yr2}"
+    # accumulate columns (not row dicts) → one vectorized numeric cast at the end
+    _c: List[Optional[str]] = []
+    _i: List[Optional[str]] = []
+    _d: List[object] = []
+    _v: List[object] = []
     page = 1
     while True:
         params["page"] = page
-        data = _safe_get(url, params).json()
+        data = _json_loads(_safe_get(url, params))
         if not isinstance(data, list) or len(data) < 2:
             break
-        meta, obs = data[0], data[1]
-        for d in obs:
-            rows.append({
-                "country": d.get("country", {}).get("value"),
-                "iso3": d.get("countryiso3code"),
-                "date": pd.to_numeric(d.get("date"), errors="coerce"),
-                "value": pd.to_numeric(d.get("value"), errors="coerce"),
-                "indicator": indicator,
-            })
-        if page >= int(meta.get("pages", 1)):
+        meta, obs = data[0], data[1] or []
+        # one list-comp per column; no throwaway {} when an observation lacks "country"
+        _c.extend([c.get("value") if (c := d.get("country")) else None for d in obs])
+        _i.extend([d.get("countryiso3code") for d in obs])
+        _d.extend([d.get("date") for d in obs])
+        _v.extend([d.get("value") for d in obs])
+        # most country×indicator queries fit in one page → stop without another round-trip
+        total = int(meta.get("total", 0) or 0)
+        per_page = int(meta.get("per_page", 0) or 0)
+        if total <= per_page * page or page >= int(meta.get("pages", 1) or 1):
             break
         page += 1
-    df = pd.DataFrame(rows).dropna(subset=["date"])
+    df = pd.DataFrame({
+        "country": _c,
+        "iso3": _i,
+        "date": pd.to_numeric(_d, errors="coerce"),
+        "value": pd.to_numeric(_v, errors="coerce"),
+        "indicator": indicator,
+    }).dropna(subset=["date"])
     if not df.empty:
-        df["country"] = df["iso3"].map(COUNTRY_LABELS).fillna(df["country"])
+        mapped = df["iso3"].map(_COUNTRY_LABELS_SER)
+        df["country"] = mapped.where(mapped.notna(), df["country"])
         df = df.sort_values(["iso3", "date"])
+        # compact dtypes: years fit int16; categoricals hash small codes in groupby/sort. `value` stays
+        # float64 — it feeds the CSV export and KPIs, and float32 would drop digits / add noise on upcast
+        df["date"] = df["date"].astype("int16")
+        df["iso3"] = df["iso3"].astype("category")
+        df["country"] = df["country"].astype("category")
+        df["indicator"] = df["indicator"].astype("category")
+        _parquet_cache_put(disk_path, df)
     return df
 
-def latest_value(df: pd.DataFrame, iso3: str) -> Tuple[Optional[int], Optional[float]]:
-    sub = df[df["iso3"] == iso3].dropna(subset=["value"]).sort_values("date")
-    if sub.empty:
-        return None, None
-    row = sub.iloc[-1]
-    return int(row["date"]), float(row["value"])
-
-def value_at_or_after(df: pd.DataFrame, iso3: str, year: int) -> Tuple[Optional[int], Optional[float]]:
-    sub = df[(df["iso3"] == iso3) & (df["date"] >= year)].dropna(subset=["value"]).sort_values("date")
-    if sub.empty:
-        return None, None
-    row = sub.iloc[0]
-    return int(row["date"]), float(row["value"])
-
-def progress_status(baseline: float, latest: float, latest_year: int,
-                    target: Optional[float], better: str) -> Tuple[str, Optional[float]]:
-    """Return (status label, progress ratio 0..1+ or None). Heuristic pace vs. target."""
-    if latest_year is None or latest_year <= BASELINE_YEAR:
-        return ("insufficient data", None)
-    if target is None or target == "":
-        return ("trend only", None)
-
-    years_done = max(1, latest_year - BASELINE_YEAR)
-    years_total = max(1, TARGET_YEAR - BASELINE_YEAR)
+def fetch_all(codes: List[str], countries: Tuple[str, ...],
+              yr1: Optional[int] = None, yr2: Optional[int] = None) -> Dict[str, pd.DataFrame]:
+    """{code: wb_fetch(code, …)} with the per-indicator HTTP round-trips overlapped on a thread pool."""
+    with _executor() as ex:
+        return dict(zip(codes, ex.map(lambda c: wb_fetch(c, countries, yr1, yr2), codes)))
+
+def latest_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Most recent non-null row per iso3 via groupby-argmax (no full-frame sort)."""
+    d = df.dropna(subset=["value"])
+    if d.empty:
+        return d
+    return d.loc[d.groupby("iso3", observed=True)["date"].idxmax()]
+
+def latest_map(df: pd.DataFrame) -> Dict[str, Tuple[int, float]]:
+    """{iso3: (year, value)} of the most recent non-null observation, in one groupby pass."""
+    r = latest_rows(df)
+    if r.empty:
+        return {}
+    return dict(zip(r["iso3"], zip(r["date"].astype(int).tolist(), r["value"].astype(float).tolist())))
 
-    if better == "up":
-        req_rate = (target - baseline) / years_total
-        act_rate = (latest - baseline) / years_done
-        progress = (latest - baseline) / (target - baseline) if (target - baseline) else None
-    else:
-        req_rate = (baseline - target) / years_total
-        act_rate = (baseline - latest) / years_done
-        progress = (baseline - latest) / (baseline - target) if (baseline - target) else None
+def baseline_map(df: pd.DataFrame, year: int) -> Dict[str, Tuple[int, float]]:
+    """{iso3: (year, value)} of the first non-null observation at/after `year`."""
+    d = df[df["date"] >= year].dropna(subset=["value"])
+    if d.empty:
+        return {}
+    r = d.loc[d.groupby("iso3", observed=True)["date"].idxmin()]
+    return dict(zip(r["iso3"], zip(r["date"].astype(int).tolist(), r["value"].astype(float).tolist())))
 
-    if progress is None or any(map(lambda x: x is None or (isinstance(x, float) and math.isnan(x)), [req_rate, act_rate])):
-        return ("trend only", None)
+@st.cache_data(show_spinner=False, ttl=3600)
+def indicator_summary(code: str, countries: Tuple[str, ...],
+                      yr1: Optional[int] = None, yr2: Optional[int] = None) -> Dict[str, object]:
+    """Pre-aggregated Overview artifacts for one indicator: baseline/latest maps + peer snapshot frame."""
+    df = wb_fetch(code, countries, yr1, yr2)
+    if df.empty:
+        return {"empty": True, "baseline": {}, "latest": {}, "peer_snapshot": pd.DataFrame()}
+    return {
+        "empty": False,
+        "baseline": baseline_map(df, BASELINE_YEAR),
+        "latest": latest_map(df),
+        "peer_snapshot": latest_rows(df),
+    }
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def wdi_table(df_key: Tuple[str, Tuple[str, ...], int, int]) -> pd.DataFrame:
+    """Drilldown "See data" view, sorted once per (indicator, countries, yr1, yr2).
+    The constant `indicator` column is dropped to keep the Arrow payload to the browser small."""
+    cols = ["country", "iso3", "date", "value"]
+    return wb_fetch(*df_key)[cols].sort_values(["country","date"]).reset_index(drop=True)
 
-    pace = act_rate / req_rate if req_rate not in (0, None) else 0.0
-    if pace >= 1.0:
-        return ("🟢 on track", progress)
-    if pace >= 0.5:
-        return ("🟠 needs acceleration", progress)
-    return ("🔴 off track", progress)
+@st.cache_data(show_spinner=False, ttl=3600)
+def assemble_wdi_combined(goal: str, countries: Tuple[str, ...], yr1: int, yr2: int) -> pd.DataFrame:
+    """All WDI series for a goal's indicators over `countries`, sorted for the Data tab CSV export."""
+    jobs = [((cfg.get("code") or "").strip(), cfg) for cfg in indicators_for_goal_cached(goal)]
+    jobs = [(code, cfg) for code, cfg in jobs if code]
+    fetched = fetch_all([code for code, _ in jobs], countries, yr1, yr2)
+    frames: List[pd.DataFrame] = [
+        fetched[code].assign(indicator_name=pd.Categorical([cfg["name"]] * len(fetched[code])))
+        for code, cfg in jobs
+    ]
+    combined = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if combined.empty:
+        return combined
+    # per-frame categories differ → concat falls back to object; re-categorize for a compact, fast sort
+    for col in ("country", "indicator", "indicator_name"):
+        combined[col] = combined[col].astype("category")
+    return combined.sort_values(["indicator","country","date"], kind="stable").reset_index(drop=True)
+
+def progress_status(stat: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Heuristic pace vs. target for all indicators at once.
+    `stat` columns: baseline, latest, latest_year, target, better. Returns (status labels, progress 0..1+ or NaN)."""
+    b = stat["baseline"].to_numpy(dtype=float)
+    l = stat["latest"].to_numpy(dtype=float)
+    ly = stat["latest_year"].to_numpy(dtype=float)
+    t = stat["target"].to_numpy(dtype=float)
+    up = stat["better"].to_numpy() == "up"
+
+    years_done = np.maximum(1, ly - BASELINE_YEAR)
+    years_total = max(1, TARGET_YEAR - BASELINE_YEAR)
+    gap = np.where(up, t - b, b - t)        # distance baseline → target
+    done = np.where(up, l - b, b - l)       # distance covered so far
+    req_rate = gap / years_total
+    act_rate = done / years_done
+    with np.errstate(divide="ignore", invalid="ignore"):
+        progress = np.where(gap != 0, done / gap, np.nan)
+        pace = np.where(req_rate != 0, act_rate / req_rate, 0.0)
+
+    labels = np.select([pace >= 1.0, pace >= 0.5], ["🟢 on track", "🟠 needs acceleration"], "🔴 off track")
+    labels = np.where(np.isnan(progress) | np.isnan(req_rate) | np.isnan(act_rate), "trend only", labels)
+    labels = np.where(np.isnan(t), "trend only", labels)
+    labels = np.where(np.isnan(ly) | (ly <= BASELINE_YEAR), "insufficient data", labels)
+    labels = np.where(np.isnan(b) | np.isnan(l), "—", labels)
+    progress = np.where(np.isin(labels, ["—", "insufficient data", "trend only"]), np.nan, progress)
+    return labels.astype(object), progress
 
 def fmt(x: Optional[float]) -> str:
     if x is None or (isinstance(x, float) and (math.isnan(x) or math.isinf(x))):
         return "—"
     return f"{x:,.2f}"
 
-def _get_qp_val(qp, key: str) -> Optional[str]:
-    if key not in qp:
-        return None
-    v = qp[key]
-    return v[0] if isinstance(v, list) and v else (v if isinstance(v, str) else None)
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """CSV-encode a frame with pyarrow's native writer when available, else pandas."""
+    if pa is not None:
+        try:
+            buf = pa.BufferOutputStream()
+            pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buf)
+            return buf.getvalue().to_pybytes()
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            pass
+    return df.to_csv(index=False).encode("utf-8")
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def wdi_csv_bytes(goal: str, countries: Tuple[str, ...], yr1: int, yr2: int) -> bytes:
+    """Encoded Data-tab CSV per selection (b"" when there is no data), so re-preparing skips the encode."""
+    combined = assemble_wdi_combined(goal, countries, yr1, yr2)
+    return b"" if combined.empty else to_csv_bytes(combined)
 
 # ------------------------------------------------------------
 # WDI metadata helpers (for Definitions tab)
 # ------------------------------------------------------------
 @st.cache_data(show_spinner=False, ttl=86400)
+@_json_disk_cache("wb_meta")
 def wb_indicator_meta(code: str) -> dict:
     """Fetch WDI indicator metadata: name, unit, definition (sourceNote), source."""
     if not code:
         return {}
     try:
-        r = requests.get(f"{WB_BASE}/indicator/{code}", params={"format": "json"}, timeout=20)
+        r = _SESSION.get(f"{WB_BASE}/indicator/{code}", params={"format": "json"}, timeout=20)
         r.raise_for_status()
-        js = r.json()
+        js = _json_loads(r)
         meta = (js[1][0] if isinstance(js, list) and len(js) > 1 and js[1] else {}) or {}
         return {
             "id": meta.get("id") or code,
@@ -266,9 +497,9 @@ def iso3_to_m49(iso3: str) -> Optional[int]:
     if iso3 in M49_LOCAL:
         return M49_LOCAL[iso3]
     try:
-        r = requests.get(f"https://restcountries.com/v3.1/alpha/{iso3}", timeout=20)
+        r = _SESSION.get(f"https://restcountries.com/v3.1/alpha/{iso3}", timeout=20)
         r.raise_for_status()
-        js = r.json()
+        js = _json_loads(r)
         if isinstance(js, list) and js and "ccn3" in js[0] and js[0]["ccn3"]:
             m = int(js[0]["ccn3"])
             M49_LOCAL[iso3] = m
@@ -278,85 +509,101 @@ def iso3_to_m49(iso3: str) -> Optional[int]:
     return None
 
 @st.cache_data(show_spinner=False, ttl=86400)
+@_json_disk_cache("un_goals")
 def un_goals() -> List[dict]:
-    r = requests.get(f"{UN_API}/Goal/List", timeout=30)
+    r = _SESSION.get(f"{UN_API}/Goal/List", timeout=30)
     r.raise_for_status()
-    return sorted(r.json(), key=lambda x: int(x["code"]))
+    return sorted(_json_loads(r), key=lambda x: int(x["code"]))
 
 @st.cache_data(show_spinner=False, ttl=86400)
+@_json_disk_cache("un_targets")
 def un_targets(goal_code: str) -> List[dict]:
-    r = requests.get(f"{UN_API}/Target/List", params={"goal": goal_code}, timeout=30)
+    r = _SESSION.get(f"{UN_API}/Target/List", params={"goal": goal_code}, timeout=30)
     r.raise_for_status()
-    rows = r.json()
+    rows = _json_loads(r)
     return sorted(rows, key=lambda x: x["code"])
 
 @st.cache_data(show_spinner=False, ttl=86400)
+@_json_disk_cache("un_indicators")
 def un_indicators(target_code: str) -> List[dict]:
-    r = requests.get(f"{UN_API}/Indicator/List", params={"target": target_code}, timeout=30)
+    r = _SESSION.get(f"{UN_API}/Indicator/List", params={"target": target_code}, timeout=30)
     r.raise_for_status()
-    rows = r.json()
+    rows = _json_loads(r)
     return sorted(rows, key=lambda x: x["code"])
 
 @st.cache_data(show_spinner=False, ttl=86400)
+@_json_disk_cache("un_series")
 def un_series(indicator_code: str) -> List[dict]:
-    r = requests.get(f"{UN_API}/Series/List", params={"indicator": indicator_code}, timeout=30)
+    r = _SESSION.get(f"{UN_API}/Series/List", params={"indicator": indicator_code}, timeout=30)
     r.raise_for_status()
-    rows = r.json()
+    rows = _json_loads(r)
     return sorted(rows, key=lambda x: x.get("code",""))
 
-def _un_series_data_via_series_api(series_code: str, area_m49: int, yr1: int, yr2: int) -> pd.DataFrame:
-    """Use simple Series/Data endpoint when available."""
+def _un_series_data_via_series_api(series_code: str, area_m49: int, yr1: int, yr2: int) -> Tuple[List[int], List[float]]:
+    """Use simple Series/Data endpoint when available. Returns (dates, values)."""
     try:
         p = {"seriesCode": series_code, "area": area_m49, "timePeriod": f"{yr1}-{yr2}"}
-        r = requests.get(f"{UN_API}/Series/Data", params=p, timeout=30)
+        r = _SESSION.get(f"{UN_API}/Series/Data", params=p, timeout=30)
         r.raise_for_status()
-        js = r.json()
+        js = _json_loads(r)
         items = js if isinstance(js, list) else js.get("data", [])
-        recs = []
+        dates: List[int] = []
+        values: List[float] = []
         for it in items:
             t = it.get("timePeriod")
             v = it.get("value")
             if t is None or v in (None, ""):
                 continue
-            recs.append({"date": int(t), "value": float(v)})
-        return pd.DataFrame(recs)
+            dates.append(int(t))
+            values.append(float(v))
+        return dates, values
     except Exception:
-        return pd.DataFrame()
-
-def _score_series_key(series_dims: List[dict], key: str) -> int:
+        return [], []
+
+TOTAL_TOKENS = frozenset(("T", "TOTAL", "TOTL", "ALL", "BTSX", "ALLAREA", "ALLAGE"))
+
+def _is_total(text: str) -> bool:
+    return text in TOTAL_TOKENS or any(tok in text for tok in TOTAL_TOKENS)
+
+def _dim_score_tables(series_dims: List[dict]) -> List[List[int]]:
+    """Per series dimension, the score of each value index — uppercasing/token scans run once per value."""
+    tables = []
+    for dim in series_dims or []:
+        did = dim.get("id", "").upper()
+        scores = []
+        for valmeta in dim["values"]:
+            valid = str(valmeta.get("id", "")).upper()
+            valname = str(valmeta.get("name", "")).upper()
+            score = 2 if (_is_total(valid) or _is_total(valname)) else 0
+            if did == "REPORTING_TYPE" and valid in ("G", "NAT", "NATIONAL"):
+                score += 3
+            scores.append(score)
+        tables.append(scores)
+    return tables
+
+def _score_series_key(dim_scores: List[List[int]], key: str) -> int:
     """Heuristic: prefer totals/national/both sexes slices."""
-    idx = list(map(int, key.split(":"))) if key else []
-    score = 0
-    total_tokens = ("T", "TOTAL", "TOTL", "ALL", "BTSX", "ALLAREA", "ALLAGE")
-    for pos, dim in enumerate(series_dims or []):
-        if pos >= len(idx): break
-        valmeta = dim["values"][idx[pos]]
-        valid = str(valmeta.get("id", "")).upper()
-        valname = str(valmeta.get("name", "")).upper()
-        if any(tok in valid for tok in total_tokens) or any(tok in valname for tok in total_tokens):
-            score += 2
-        did = dim.get("id","").upper()
-        if did == "REPORTING_TYPE" and valid in ("G","NAT","NATIONAL"):
-            score += 3
-    return score
-
-def _un_series_data_via_sdmx(series_code: str, area_m49: int, yr1: int, yr2: int) -> pd.DataFrame:
+    if not key:
+        return 0
+    return sum(dim_scores[pos][int(i)] for pos, i in enumerate(key.split(":")[:len(dim_scores)]))
+
+def _un_series_data_via_sdmx(series_code: str, area_m49: int, yr1: int, yr2: int) -> Tuple[List[int], List[float]]:
     """
     SDMX fallback: query DF_SDG_GLH by SERIES + REF_AREA + annual freq.
-    Pick the 'best' disaggregation (totals) using a simple score.
+    Pick the 'best' disaggregation (totals) using a simple score. Returns (dates, values).
     """
     try:
         key = f"{series_code}.{area_m49}.A"
         params = {"time": f"{yr1}:{yr2}", "contentType": "json"}
         url = f"{UN_SDMX_BASE}/{key}"
-        r = requests.get(url, params=params, timeout=40)
+        r = _SESSION.get(url, params=params, timeout=40)
         r.raise_for_status()
-        js = r.json()
+        js = _json_loads(r)
 
         ds = js.get("dataSets", [{}])[0]
         sers = ds.get("series", {})
         if not sers:
-            return pd.DataFrame()
+            return [], []
 
         series_dims = js["structure"]["dimensions"].get("series", [])
         obs_dims = js["structure"]["dimensions"].get("observation", [])
@@ -367,19 +614,21 @@ def _un_series_data_via_sdmx(series_code: str, area_m49: int, yr1: int, yr2: int
                 time_pos = i
                 break
         if time_pos is None:
-            return pd.DataFrame()
+            return [], []
         time_values = obs_dims[time_pos]["values"]
 
         # choose best series key
+        dim_scores = _dim_score_tables(series_dims)
         best_key, best_score = None, -1
         for k, ser in sers.items():
-            score = _score_series_key(series_dims, k)
+            score = _score_series_key(dim_scores, k)
             if score > best_score and ser.get("observations"):
                 best_key, best_score = k, score
         if best_key is None:
-            return pd.DataFrame()
+            return [], []
         observations = sers[best_key].get("observations", {})
-        recs = []
+        dates: List[int] = []
+        values: List[float] = []
         for k, val in observations.items():
             idx = list(map(int, k.split(":")))
             t_idx = idx[time_pos]
@@ -387,32 +636,210 @@ def _un_series_data_via_sdmx(series_code: str, area_m49: int, yr1: int, yr2: int
             v = val[0]
             if v is None:
                 continue
-            recs.append({"date": year, "value": float(v)})
-        return pd.DataFrame(recs)
+            dates.append(year)
+            values.append(float(v))
+        return dates, values
     except Exception:
+        return [], []
+
+class _NoUNData(Exception):
+    """Raised inside the cached UN fetch so an empty result (often a swallowed timeout/5xx) isn't cached."""
+
+def un_fetch_series_timeseries(series_code: str, iso3_list: Tuple[str, ...], yr1: int, yr2: int) -> pd.DataFrame:
+    """Return tidy df: country, iso3, date, value (one UN Series code at a time); empty when nothing came back."""
+    try:
+        return _un_fetch_series_timeseries(series_code, iso3_list, yr1, yr2)
+    except _NoUNData:
         return pd.DataFrame()
 
-def un_fetch_series_timeseries(series_code: str, iso3_list: List[str], yr1: int, yr2: int) -> pd.DataFrame:
-    """Return tidy df: country, iso3, date, value (one UN Series code at a time)."""
-    frames = []
-    for iso in iso3_list:
+@st.cache_data(show_spinner=False, ttl=3600)
+def _un_fetch_series_timeseries(series_code: str, iso3_list: Tuple[str, ...], yr1: int, yr2: int) -> pd.DataFrame:
+    def _one(iso: str) -> Tuple[List[int], List[float]]:
         a = iso3_to_m49(iso)
         if not a:
-            continue
-        df = _un_series_data_via_series_api(series_code, a, yr1, yr2)
-        if df.empty:
-            df = _un_series_data_via_sdmx(series_code, a, yr1, yr2)
-        if not df.empty:
-            df["iso3"] = iso
-            df["country"] = COUNTRY_LABELS.get(iso, iso)
-            frames.append(df)
-    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            return [], []
+        dates, values = _un_series_data_via_series_api(series_code, a, yr1, yr2)
+        if not dates:
+            dates, values = _un_series_data_via_sdmx(series_code, a, yr1, yr2)
+        return dates, values
+
+    # countries are independent network round-trips → fan out; one DataFrame built from flat columns
+    all_dates: List[int] = []
+    all_vals: List[float] = []
+    all_iso: List[str] = []
+    with _executor() as ex:
+        for iso, (dates, values) in zip(iso3_list, ex.map(_one, iso3_list)):
+            all_dates.extend(dates)
+            all_vals.extend(values)
+            all_iso.extend([iso] * len(dates))
+    if not all_dates:
+        raise _NoUNData(series_code)
+    return pd.DataFrame({
+        "date": np.asarray(all_dates, dtype="int16"),
+        "value": np.asarray(all_vals, dtype="float32"),
+        "iso3": pd.Categorical(all_iso),
+        "country": pd.Categorical([COUNTRY_LABELS.get(i, i) for i in all_iso]),
+    })
 
 # ------------------------------------------------------------
 # UI helpers — ALWAYS show all 17 goals in the selector
 # ------------------------------------------------------------
 def goal_labels_all_17() -> List[str]:
-    return [f"SDG {i} · {SDG_NAMES[i]}" for i in range(1, 18)]
+    return list(SDG_NO_BY_LABEL)
+
+@st.cache_resource(show_spinner=False, ttl=86400)
+def _un_choices(level: str, parent: str = "") -> Tuple[Tuple[str, ...], Dict[str, dict]]:
+    """Selectbox titles and title → record map for one UN hierarchy level (shared, read-only)."""
+    if level == "goal":
+        by_title = {f"SDG {g['code']} · {g['title']}": g for g in un_goals()}
+    elif level == "target":
+        by_title = {f"{t['code']} — {t['title']}": t for t in un_targets(parent)}
+    elif level == "indicator":
+        by_title = {f"{i['code']} — {i.get('description','')}": i for i in un_indicators(parent)}
+    else:
+        by_title = {f"{s['code']} — {s.get('description','')}": s for s in un_series(parent) or []}
+    return tuple(by_title), by_title
+
+def un_hierarchy_picker(prefix: str, goal_label: str, series_optional: bool = False) -> Optional[Dict[str, object]]:
+    """UN SDG Goal → Target → Indicator → Series selectboxes, shared by Drilldown and Definitions.
+    Widget keys are namespaced by `prefix`. Returns None (after an info message) when a level is empty."""
+    goal_titles, goal_by_title = _un_choices("goal")
+    goal_codes = [g["code"] for g in goal_by_title.values()]
+    default_goal_num = str(int(goal_label.split()[1])) if goal_label.startswith("SDG ") else "1"
+    g_sel = st.selectbox("Goal (UN SDG)", goal_titles, key=f"{prefix}_goal",
+                         index=goal_codes.index(default_goal_num) if default_goal_num in goal_codes else 0)
+    g_code = goal_by_title[g_sel]["code"]
+
+    target_titles, target_by_title = _un_choices("target", g_code)
+    if not target_titles:
+        st.info("No targets returned for this goal.")
+        return None
+    t_sel = st.selectbox("Target", target_titles, index=0, key=f"{prefix}_target")
+    t_code = target_by_title[t_sel]["code"]
+
+    ind_titles, ind_by_title = _un_choices("indicator", t_code)
+    if not ind_titles:
+        st.info("No indicators returned for this target.")
+        return None
+    i_sel = st.selectbox("Indicator", ind_titles, index=0, key=f"{prefix}_indicator")
+    i_obj = ind_by_title[i_sel]
+
+    series_titles, series_by_title = _un_choices("series", i_obj["code"])
+    if series_optional:
+        s_sel = st.selectbox("Series (optional)", ("(none)",) + series_titles, index=0,
+                             key=f"{prefix}_series")
+        s_obj = series_by_title.get(s_sel)
+    else:
+        if not series_titles:
+            st.info("This indicator currently has no published series in the UN Global Database.")
+            return None
+        s_sel = st.selectbox("Series (choose a headline/total series if available)", series_titles,
+                             index=0, key=f"{prefix}_series")
+        s_obj = series_by_title[s_sel]
+    return {"goal": g_code, "target": t_code, "indicator": i_obj, "series": s_obj}
+
+# st.fragment (≥1.37; experimental_ before that) bounds the rerun scope; no-op decorator on older Streamlit
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda f: f)
+
+# ------------------------------------------------------------
+# Chart builders — Figure objects cached as resources (never mutate the returned figure)
+# ------------------------------------------------------------
+@st.cache_resource(show_spinner=False, ttl=3600)
+def build_peer_snapshot(specs: Tuple[Tuple[str, str, str], ...], countries: Tuple[str, ...],
+                        template: str, log_y: bool) -> Optional[go.Figure]:
+    """Peer snapshot as one figure: a bar subplot (latest value per country) per (code, name, better)
+    spec, each sorted best-first with its own axes; None when nothing to plot."""
+    panels = []
+    for code, name, better in specs:
+        summ = indicator_summary(code, countries)
+        if not summ["empty"] and not summ["peer_snapshot"].empty:
+            snap = summ["peer_snapshot"].sort_values("value", ascending=(better == "down"))
+            panels.append((f"<b>{name}</b>  ·  {code}", snap))
+    if not panels:
+        return None
+    n = len(panels)
+    fig = make_subplots(rows=n, cols=1, subplot_titles=[t for t, _ in panels],
+                        vertical_spacing=min(0.3, 90 / (300 * n)))
+    for row, (_, snap) in enumerate(panels, start=1):
+        fig.add_trace(go.Bar(x=snap["country"], y=snap["value"], name="", showlegend=False), row=row, col=1)
+    fig.update_annotations(xanchor="left", x=0, font_size=14)
+    if log_y:
+        fig.update_yaxes(type="log")
+    fig.update_layout(template=template, margin=dict(l=10, r=10, t=30, b=0), height=300 * n)
+    return fig
+
+@st.cache_resource(show_spinner=False, ttl=3600)
+def build_wdi_line(df_key: Tuple[str, Tuple[str, ...], int, int], ind_label: str,
+                   template: str, log_y: bool, smooth3: bool) -> go.Figure:
+    """Drilldown multi-country line chart; df_key = (indicator, countries, yr1, yr2)."""
+    df = wb_fetch(*df_key)
+    if smooth3:  # df is (iso3, date)-sorted, so the rolling window runs in year order per country
+        df = df.assign(value_smooth=df.groupby("country", sort=False, observed=True)["value"]
+                                      .rolling(window=3, min_periods=1).mean()
+                                      .reset_index(level=0, drop=True))
+    # WebGL traces built directly (no Plotly Express per-group machinery); smoothed line shares the color
+    colorway = pio.templates[template].layout.colorway or px.colors.qualitative.Plotly
+    fig = go.Figure(layout=dict(template=template, xaxis_title="Year", yaxis_title=ind_label))
+    for i, (name, g) in enumerate(df.groupby("country", sort=False, observed=True)):
+        color = colorway[i % len(colorway)]
+        fig.add_trace(go.Scattergl(x=g["date"], y=g["value"], mode="lines+markers", name=name,
+                                   legendgroup=name, line=dict(color=color)))
+        if smooth3:
+            fig.add_trace(go.Scattergl(x=g["date"], y=g["value_smooth"], mode="lines", name=name,
+                                       legendgroup=name, showlegend=False,
+                                       line=dict(color=color, dash="dash")))
+    if log_y: fig.update_yaxes(type="log")
+    fig.update_layout(margin=dict(l=10, r=10, t=10, b=0), height=460)
+    return fig
+
+@_fragment
+def _render_peer_snapshot(ind_cfgs: List[Dict[str, object]], countries: Tuple[str, ...], template: str) -> None:
+    """Peer snapshot (latest values) for every indicator of the goal, sent as a single chart.
+    Its log toggle lives inside the fragment, so flipping it reruns only this block."""
+    log_y = st.toggle("Log scale", value=False, key="peer_log_y")
+    specs = tuple((code, str(cfg["name"]), str(cfg["better"]))
+                  for cfg in ind_cfgs if (code := (cfg.get("code") or "").strip()))
+    fig = build_peer_snapshot(specs, countries, template, log_y)
+    if fig is not None:
+        st.plotly_chart(fig, use_container_width=True)
+
+@_fragment
+def render_wdi_chart(df_key: Tuple[str, Tuple[str, ...], int, int], ind_label: str, template: str) -> None:
+    """Drilldown chart + India KPIs + data table. The view toggles live inside the fragment,
+    so flipping them reruns only this block."""
+    t1, t2, t3 = st.columns(3)
+    log_y = t1.toggle("Log scale", value=False)
+    smooth3 = t2.toggle("3-year smoothing", value=False)
+    show_table = t3.toggle("Show data table", value=False)
+
+    fig = build_wdi_line(df_key, ind_label, template, log_y, smooth3)
+    st.plotly_chart(fig, use_container_width=True)
+
+    # KPIs for India (baseline/latest maps are built in one groupby pass and cached per df_key)
+    summ = indicator_summary(*df_key)
+    l_y, l_v = summ["latest"].get(DEFAULT_COUNTRY, (None, None))
+    b_y, b_v = summ["baseline"].get(DEFAULT_COUNTRY, (None, None))
+    dv = (l_v - b_v) if (b_v is not None and l_v is not None) else None
+    k1, k2, k3 = st.columns(3)
+    k1.metric("India latest", f"{fmt(l_v)}", f"Year {l_y if l_y else '—'}")
+    k2.metric("Baseline", f"{fmt(b_v)}", f"Year {BASELINE_YEAR}")
+    k3.metric("Δ since baseline", f"{fmt(dv)}" if dv is not None else "—")
+
+    if show_table:
+        with st.expander("See data"):
+            st.dataframe(wdi_table(df_key), use_container_width=True, height=360, hide_index=True)
+
+@_fragment
+def render_un_chart(dfu: pd.DataFrame, s_code: str, template: str) -> None:
+    """UN SDG series line chart; its log toggle reruns only this fragment."""
+    log_y = st.toggle("Log scale", value=False)
+    figu = px.line(dfu, x="date", y="value", color="country",
+                   labels={"date":"Year", "value": f"{s_code} (UN SDG)"},
+                   template=template, markers=True, render_mode="webgl")
+    if log_y: figu.update_yaxes(type="log")
+    figu.update_layout(margin=dict(l=10, r=10, t=10, b=0), height=460)
+    st.plotly_chart(figu, use_container_width=True)
+    st.caption("Source: UN SDG Global Database (harmonized SDMX dataflow)")
 
 # ------------------------------------------------------------
 # Sidebar — form-based controls (best-practice: fewer reruns)
@@ -426,21 +853,18 @@ def init_defaults(catalog: pd.DataFrame):
             "manual_peers": ["BGD", "PAK", "LKA", "NPL"],
             "yr1": 2000,
             "yr2": datetime.now().year,
-            "log_y": False,
-            "smooth3": False,
             "theme": "Light",
-            "show_table": False,
             "search": "",
             "data_src": "World Bank (WDI subset)",
         }
         # hydrate from URL
         qp = st.query_params
         if qp:
-            goal = _get_qp_val(qp, "goal")
-            peers = _get_qp_val(qp, "peers")
-            yr1 = _get_qp_val(qp, "yr1")
-            yr2 = _get_qp_val(qp, "yr2")
-            theme = _get_qp_val(qp, "theme")
+            goal = qp.get("goal")
+            peers = qp.get("peers")
+            yr1 = qp.get("yr1")
+            yr2 = qp.get("yr2")
+            theme = qp.get("theme")
             if goal:
                 st.session_state.controls["goal"] = goal
             if yr1:
@@ -453,7 +877,8 @@ def init_defaults(catalog: pd.DataFrame):
                 st.session_state.controls["theme"] = "Dark" if theme.lower()=="dark" else "Light"
             if peers:
                 iso_list = [p.strip() for p in peers.split(",") if p.strip()]
-                st.session_state.controls["manual_peers"] = [p for p in iso_list if p != DEFAULT_COUNTRY]
+                default_set = {DEFAULT_COUNTRY}
+                st.session_state.controls["manual_peers"] = [p for p in iso_list if p not in default_set]
 
 def controls_form(catalog: pd.DataFrame) -> dict:
     init_defaults(catalog)
@@ -469,15 +894,11 @@ def controls_form(catalog: pd.DataFrame) -> dict:
                                 index=goal_labels.index(c["goal"]) if c["goal"] in goal_labels else 0)
             preset = st.selectbox("Peer preset", list(PEER_PRESETS.keys()),
                                   index=list(PEER_PRESETS.keys()).index(c["preset"]))
-            all_peers = sorted(set(sum(PEER_PRESETS.values(), [])) | set(["USA","CHN","BRA","ZAF","IDN","VNM"]))
-            manual_peers = st.multiselect("Peers (ISO-3, India is always included)", options=all_peers,
+            manual_peers = st.multiselect("Peers (ISO-3, India is always included)", options=ALL_PEERS,
                                           default=c["manual_peers"])
             yr1, yr2 = st.slider("Year range", min_value=1990, max_value=datetime.now().year,
                                  value=(c["yr1"], c["yr2"]), step=1)
-            log_y = st.toggle("Log scale (y-axis)", value=c["log_y"])
-            smooth3 = st.toggle("3-year smoothing overlay", value=c["smooth3"])
             theme = st.selectbox("Chart theme", ["Light", "Dark"], index=0 if c["theme"]=="Light" else 1)
-            show_table = st.toggle("Show data table in Drilldown", value=c["show_table"])
             search = st.text_input("Search indicators (WDI Drilldown)", value=c["search"])
             apply_btn = st.form_submit_button("Apply")
 
@@ -489,13 +910,12 @@ def controls_form(catalog: pd.DataFrame) -> dict:
                     "preset": "SAARC",
                     "manual_peers": ["BGD", "PAK", "LKA", "NPL"],
                     "yr1": 2000, "yr2": datetime.now().year,
-                    "log_y": False, "smooth3": False, "theme": "Light",
-                    "show_table": False, "search": "", "data_src": "World Bank (WDI subset)",
+                    "theme": "Light", "search": "", "data_src": "World Bank (WDI subset)",
                 }
                 st.rerun()
         with co2:
             if st.button("Permalink"):
-                peers_iso = list(dict.fromkeys(PEER_PRESETS[c["preset"]] + c["manual_peers"]))  # dedupe keep order
+                peers_iso = list(dict.fromkeys(chain(PEER_PRESETS[c["preset"]], c["manual_peers"])))  # dedupe keep order
                 params = {
                     "goal": c["goal"], "peers": ",".join(peers_iso),
                     "yr1": c["yr1"], "yr2": c["yr2"], "theme": c["theme"].lower(),
@@ -506,8 +926,7 @@ def controls_form(catalog: pd.DataFrame) -> dict:
     if apply_btn:
         st.session_state.controls = {
             "goal": goal, "preset": preset, "manual_peers": manual_peers,
-            "yr1": yr1, "yr2": yr2, "log_y": log_y, "smooth3": smooth3,
-            "theme": theme, "show_table": show_table, "search": search,
+            "yr1": yr1, "yr2": yr2, "theme": theme, "search": search,
             "data_src": src,
         }
         c = st.session_state.controls
@@ -522,9 +941,7 @@ goal = controls["goal"]
 preset = controls["preset"]
 manual_peers = controls["manual_peers"]
 yr1, yr2 = controls["yr1"], controls["yr2"]
-log_y, smooth3 = controls["log_y"], controls["smooth3"]
 template = "plotly_dark" if controls["theme"] == "Dark" else "plotly"
-show_table = controls["show_table"]
 search_q = (controls["search"] or "").strip().lower()
 data_src = controls.get("data_src", "World Bank (WDI subset)")
 
@@ -535,29 +952,30 @@ tab_overview, tab_drill, tab_defs, tab_data = st.tabs(["Overview", "Drilldown",
 # ------------------------------------------------------------
 with tab_overview:
     # Hero with SDG icon (spaced)
-    try:
-        sdg_no = int(goal.split()[1])
-    except Exception:
-        sdg_no = 1
+    sdg_no = SDG_NO_BY_LABEL.get(goal)
+    if sdg_no is None:  # non-canonical permalink label (e.g. "SDG 5"): parse it like indicators_for_goal
+        try:
+            sdg_no = int(goal.split()[1])
+        except Exception:
+            sdg_no = 1
     c1, c2 = st.columns([1, 5], gap="large")
     with c1:
-        st.image(sdg_icon_url(sdg_no), width=128)
+        st.image(sdg_icon(sdg_no), width=128)
     with c2:
         st.markdown(f"<h1 style='margin:0'>{goal}</h1>", unsafe_allow_html=True)
         st.caption(f"Baseline: {BASELINE_YEAR} · Target year: {TARGET_YEAR} · India + peers")
 
     # Build country list
-    countries = [DEFAULT_COUNTRY] + list(dict.fromkeys(PEER_PRESETS[preset] + manual_peers))
-    ind_cfgs = indicators_for_goal(CATALOG, goal)
+    countries = list(dict.fromkeys(chain([DEFAULT_COUNTRY], PEER_PRESETS[preset], manual_peers)))
+    ind_cfgs = indicators_for_goal_cached(goal)
 
-    # Fetch data for all indicators with a WDI code
+    # Fetch + summarise all indicators with a WDI code (independent HTTP calls → thread pool)
     with st.spinner("Fetching World Bank data…"):
-        df_map: Dict[str, pd.DataFrame] = {}
-        for cfg in ind_cfgs:
-            code = (cfg.get("code") or "").strip()
-            if not code:
-                continue
-            df_map[code] = wb_fetch(code, countries)
+        codes = [(cfg.get("code") or "").strip() for cfg in ind_cfgs]
+        codes = [c for c in codes if c]
+        with _executor() as ex:
+            summaries: Dict[str, dict] = dict(zip(
+                codes, ex.map(lambda c: indicator_summary(c, tuple(countries)), codes)))
 
     # India quick status table
     st.markdown("### 🇮🇳 India — Quick status")
@@ -568,29 +986,33 @@ with tab_overview:
     header[3].markdown("**Δ since baseline**")
     header[4].markdown("**2030 check**")
 
-    any_row = False
+    rows = []
     for cfg in ind_cfgs:
         code = (cfg.get("code") or "").strip()
-        df_i = df_map.get(code, pd.DataFrame())
-        if df_i.empty:
+        summ = summaries.get(code)
+        if not summ or summ["empty"]:
             continue
-        b_y, b_v = value_at_or_after(df_i, DEFAULT_COUNTRY, BASELINE_YEAR)
-        l_y, l_v = latest_value(df_i, DEFAULT_COUNTRY)
-        dv = (l_v - b_v) if (b_v is not None and l_v is not None) else None
-        status, prog = ("—", None)
-        if b_v is not None and l_v is not None:
-            status, prog = progress_status(b_v, l_v, l_y, cfg.get("target2030"), cfg["better"])
+        b_y, b_v = summ["baseline"].get(DEFAULT_COUNTRY, (None, None))
+        l_y, l_v = summ["latest"].get(DEFAULT_COUNTRY, (None, None))
+        rows.append((cfg, code, b_v, l_y, l_v))
+
+    stat = pd.DataFrame({
+        "baseline": [r[2] for r in rows], "latest": [r[4] for r in rows], "latest_year": [r[3] for r in rows],
+        "target": [r[0].get("target2030") for r in rows], "better": [r[0]["better"] for r in rows],
+    })
+    statuses, progs = progress_status(stat)
 
+    any_row = False
+    for (cfg, code, b_v, l_y, l_v), status, prog in zip(rows, statuses, progs):
+        dv = (l_v - b_v) if (b_v is not None and l_v is not None) else None
         c0, c1, c2, c3, c4 = st.columns([2.8, 1.2, 1.2, 1.6, 1.8])
         c0.markdown(f"**{cfg['name']}**  \n`{code}`")
         c1.write(fmt(b_v))
         c2.write(f"{fmt(l_v)}{' (' + str(l_y) + ')' if l_y else ''}")
         c3.write(fmt(dv) if dv is not None else "—")
-        if prog is None:
-            c4.write(status)
-        else:
-            c4.write(status)
-            c4.progress(min(max(prog, 0.0), 1.0))
+        c4.write(status)
+        if not np.isnan(prog):
+            c4.progress(min(max(float(prog), 0.0), 1.0))
         any_row = True
 
     if not any_row:
@@ -599,36 +1021,18 @@ with tab_overview:
 
     # Peer snapshot mini-charts (latest values)
     st.markdown("### Peer snapshot (latest available)")
-    for cfg in ind_cfgs:
-        code = (cfg.get("code") or "").strip()
-        df_i = df_map.get(code, pd.DataFrame())
-        if df_i.empty:
-            continue
-        latest_vals = (
-            df_i.dropna(subset=["value"])
-               .sort_values(["country", "date"])
-               .groupby("country", as_index=False).tail(1)
-               .sort_values("value", ascending=(cfg["better"] == "down"))
-        )
-        if latest_vals.empty:
-            continue
-        st.markdown(f"**{cfg['name']}**  ·  `{code}`")
-        fig = px.bar(latest_vals, x="country", y="value", template=template)
-        if log_y:
-            fig.update_yaxes(type="log")
-        fig.update_layout(margin=dict(l=10, r=10, t=10, b=0), height=300)
-        st.plotly_chart(fig, use_container_width=True)
+    _render_peer_snapshot(ind_cfgs, tuple(countries), template)
 
 # ------------------------------------------------------------
 # Drilldown (WDI subset OR UN SDG ALL)
 # ------------------------------------------------------------
 with tab_drill:
     st.subheader("Drilldown by indicator")
-    countries = [DEFAULT_COUNTRY] + list(dict.fromkeys(PEER_PRESETS[preset] + manual_peers))
+    countries = list(dict.fromkeys(chain([DEFAULT_COUNTRY], PEER_PRESETS[preset], manual_peers)))
 
     if data_src == "World Bank (WDI subset)":
         # WDI path (catalog-driven)
-        ind_all = indicators_for_goal(CATALOG, goal)
+        ind_all = indicators_for_goal_cached(goal)
         ind_cfgs = [c for c in ind_all if search_q in str(c.get("name","")).lower()] if search_q else ind_all
         if not ind_cfgs:
             st.info("No indicators match your search for this goal.")
@@ -642,85 +1046,25 @@ with tab_drill:
             st.info("This series has no WDI code in the catalog. Switch to **UN SDG (ALL)** to browse the full list.")
             st.stop()
 
-        df = wb_fetch(code, countries)
-        df = df[(df["date"] >= yr1) & (df["date"] <= yr2)]
-        if df.empty:
+        # emptiness from the small cached summary, so a rerun doesn't unpickle the full frame
+        if indicator_summary(code, tuple(countries), yr1, yr2)["empty"]:
             st.info("No data available for this selection.")
             st.stop()
 
-        fig = px.line(df, x="date", y="value", color="country",
-                      labels={"date":"Year", "value": ind_label}, template=template, markers=True)
-        if smooth3:
-            smoothed = (
-                df.sort_values(["country","date"])
-                  .groupby("country", as_index=False)
-                  .apply(lambda g: g.assign(value_smooth=g["value"].rolling(window=3, min_periods=1).mean()))
-                  .reset_index(drop=True)
-            )
-            fig2 = px.line(smoothed, x="date", y="value_smooth", color="country", template=template)
-            for tr in fig2.data:
-                tr.update(line=dict(dash="dash"))
-                fig.add_trace(tr)
-        if log_y: fig.update_yaxes(type="log")
-        fig.update_layout(margin=dict(l=10, r=10, t=10, b=0), height=460)
-        st.plotly_chart(fig, use_container_width=True)
-
-        # KPIs for India
-        l_y, l_v = latest_value(df, DEFAULT_COUNTRY)
-        b_y, b_v = value_at_or_after(df, DEFAULT_COUNTRY, BASELINE_YEAR)
-        dv = (l_v - b_v) if (b_v is not None and l_v is not None) else None
-        k1, k2, k3 = st.columns(3)
-        k1.metric("India latest", f"{fmt(l_v)}", f"Year {l_y if l_y else '—'}")
-        k2.metric("Baseline", f"{fmt(b_v)}", f"Year {BASELINE_YEAR}")
-        k3.metric("Δ since baseline", f"{fmt(dv)}" if dv is not None else "—")
-
-        if show_table:
-            with st.expander("See data"):
-                st.dataframe(df.sort_values(["country","date"]).reset_index(drop=True),
-                             use_container_width=True, height=360)
+        render_wdi_chart((code, tuple(countries), yr1, yr2), ind_label, template)
 
     else:
         # UN SDG ALL path (Goal → Target → Indicator → Series)
         st.markdown("Browse the **full** UN SDG hierarchy. Pick a *Series* to plot (when available).")
 
-        # UN Goals (1..17); align default with selected WDI goal
-        goals = un_goals()
-        goal_codes = [g["code"] for g in goals]
-        goal_titles = [f"SDG {g['code']} · {g['title']}" for g in goals]
-        default_goal_num = str(int(goal.split()[1])) if goal.startswith("SDG ") else "1"
-        g_sel = st.selectbox("Goal (UN SDG)", goal_titles,
-                             index=goal_codes.index(default_goal_num) if default_goal_num in goal_codes else 0)
-        g_code = goals[goal_titles.index(g_sel)]["code"]
-
-        # Targets
-        trgs = un_targets(g_code)
-        if not trgs:
-            st.info("No targets returned for this goal.")
-            st.stop()
-        t_titles = [f"{t['code']} — {t['title']}" for t in trgs]
-        t_sel = st.selectbox("Target", t_titles, index=0)
-        t_code = trgs[t_titles.index(t_sel)]["code"]
-
-        # Indicators
-        inds = un_indicators(t_code)
-        if not inds:
-            st.info("No indicators returned for this target.")
-            st.stop()
-        i_titles = [f"{i['code']} — {i.get('description','')}" for i in inds]
-        i_sel = st.selectbox("Indicator", i_titles, index=0)
-        i_code = inds[i_titles.index(i_sel)]["code"]
-
-        # Series under the indicator
-        sers = un_series(i_code)
-        if not sers:
-            st.info("This indicator currently has no published series in the UN Global Database.")
+        # UN Goals (1..17); default aligned with the selected WDI goal
+        pick = un_hierarchy_picker("drill", goal)
+        if pick is None:
             st.stop()
-        s_titles = [f"{s['code']} — {s.get('description','')}" for s in sers]
-        s_sel = st.selectbox("Series (choose a headline/total series if available)", s_titles, index=0)
-        s_code = sers[s_titles.index(s_sel)]["code"]
+        s_code = pick["series"]["code"]
 
         with st.spinner("Fetching UN SDG series…"):
-            dfu = un_fetch_series_timeseries(s_code, countries, yr1, yr2)
+            dfu = un_fetch_series_timeseries(s_code, tuple(countries), yr1, yr2)
 
         if dfu.empty:
             st.warning(
@@ -730,13 +1074,7 @@ with tab_drill:
             )
             st.caption("Tip: pick a series that looks like a headline or 'total' variant.")
         else:
-            figu = px.line(dfu, x="date", y="value", color="country",
-                           labels={"date":"Year", "value": f"{s_code} (UN SDG)"},
-                           template=template, markers=True)
-            if log_y: figu.update_yaxes(type="log")
-            figu.update_layout(margin=dict(l=10, r=10, t=10, b=0), height=460)
-            st.plotly_chart(figu, use_container_width=True)
-            st.caption("Source: UN SDG Global Database (harmonized SDMX dataflow)")
+            render_un_chart(dfu, s_code, template)
 
 # ------------------------------------------------------------
 # Definitions (WDI metadata or UN descriptions)
@@ -746,7 +1084,7 @@ with tab_defs:
 
     if data_src == "World Bank (WDI subset)":
         st.caption("Source: World Bank World Development Indicators (WDI) metadata.")
-        ind_all = indicators_for_goal(CATALOG, goal)
+        ind_all = indicators_for_goal_cached(goal)
         if not ind_all:
             st.info("No indicators mapped for this goal in your WDI catalog yet.")
         else:
@@ -774,69 +1112,38 @@ with tab_defs:
                     st.code(f"{WB_BASE}/indicator/{code}?format=json", language="text")
 
                 with st.expander("See all definitions for this goal"):
-                    rows = []
                     with st.spinner("Loading indicator metadata…"):
-                        for c in ind_all:
-                            k = (c.get("code") or "").strip()
-                            if not k:
-                                rows.append({"Indicator": c["name"], "Code": "—", "Unit": "—",
-                                             "Definition (short)": "No WDI code in catalog"})
-                                continue
-                            m = wb_indicator_meta(k)
-                            rows.append({
-                                "Indicator": m.get("name") or c["name"],
-                                "Code": k,
-                                "Unit": m.get("unit") or "",
-                                "Definition (short)": _short(m.get("sourceNote") or ""),
-                            })
-                    if rows:
-                        st.dataframe(pd.DataFrame(rows), use_container_width=True, height=420)
+                        codes = [(c.get("code") or "").strip() for c in ind_all]
+                        wdi_codes = [k for k in codes if k]
+                        with _executor() as ex:
+                            metas = dict(zip(wdi_codes, ex.map(wb_indicator_meta, wdi_codes)))
+                        defs = pd.DataFrame({
+                            "Indicator": [(metas[k].get("name") if k else None) or c["name"]
+                                          for c, k in zip(ind_all, codes)],
+                            "Code": [k or "—" for k in codes],
+                            "Unit": [(metas[k].get("unit") or "") if k else "—" for k in codes],
+                            "Definition (short)": [_short(metas[k].get("sourceNote") or "", 200) if k
+                                                   else "No WDI code in catalog" for k in codes],
+                        })
+                    if not defs.empty:
+                        st.dataframe(defs, use_container_width=True, height=420, hide_index=True)
 
     else:
         st.caption("Source: UN SDG Global Database (official SDG hierarchy).")
-        goals = un_goals()
-        goal_codes = [g["code"] for g in goals]
-        goal_titles = [f"SDG {g['code']} · {g['title']}" for g in goals]
-        default_goal_num = str(int(goal.split()[1])) if goal.startswith("SDG ") else "1"
-        g_sel = st.selectbox("Goal (UN SDG)", goal_titles,
-                             index=goal_codes.index(default_goal_num) if default_goal_num in goal_codes else 0)
-        g_code = goals[goal_titles.index(g_sel)]["code"]
-
-        trgs = un_targets(g_code)
-        if not trgs:
-            st.info("No targets returned for this goal.")
-        else:
-            t_titles = [f"{t['code']} — {t['title']}" for t in trgs]
-            t_sel = st.selectbox("Target", t_titles, index=0)
-            t_code = trgs[t_titles.index(t_sel)]["code"]
-
-            inds = un_indicators(t_code)
-            if not inds:
-                st.info("No indicators returned for this target.")
-            else:
-                i_titles = [f"{i['code']} — {i.get('description','')}" for i in inds]
-                i_sel = st.selectbox("Indicator", i_titles, index=0)
-                i_code = inds[i_titles.index(i_sel)]["code"]
-                i_obj = inds[i_titles.index(i_sel)]
-
-                sers = un_series(i_code)
-                s_titles = [f"{s['code']} — {s.get('description','')}" for s in sers] if sers else []
-                s_sel = st.selectbox("Series (optional)", ["(none)"] + s_titles, index=0)
-                s_obj = None
-                if s_sel != "(none)":
-                    s_obj = sers[s_titles.index(s_sel)]
-
-                st.markdown(f"### Indicator {i_code}")
+        pick = un_hierarchy_picker("defs", goal, series_optional=True)
+        if pick is not None:
+            i_obj, s_obj = pick["indicator"], pick["series"]
+            st.markdown(f"### Indicator {i_obj['code']}")
+            st.markdown("**Description**")
+            st.write(i_obj.get("description") or i_obj.get("tier") or "—")
+
+            if s_obj:
+                st.markdown("---")
+                st.markdown(f"### Series {s_obj.get('code')}")
                 st.markdown("**Description**")
-                st.write(i_obj.get("description") or i_obj.get("tier") or "—")
-
-                if s_obj:
-                    st.markdown("---")
-                    st.markdown(f"### Series {s_obj.get('code')}")
-                    st.markdown("**Description**")
-                    st.write(s_obj.get("description") or "—")
-                    st.markdown("**Note**")
-                    st.write("Some series require specific disaggregation filters to retrieve data via SDMX.")
+                st.write(s_obj.get("description") or "—")
+                st.markdown("**Note**")
+                st.write("Some series require specific disaggregation filters to retrieve data via SDMX.")
 
 # ------------------------------------------------------------
 # Data & Sources
@@ -850,28 +1157,24 @@ with tab_data:
     st.markdown(f"Baseline year: **{BASELINE_YEAR}**, target year: **{TARGET_YEAR}**. "
                 "2030 status is a heuristic pace check vs target (when available).")
 
-    countries = [DEFAULT_COUNTRY] + list(dict.fromkeys(PEER_PRESETS[preset] + manual_peers))
-    ind_cfgs = indicators_for_goal(CATALOG, goal)
+    countries = list(dict.fromkeys(chain([DEFAULT_COUNTRY], PEER_PRESETS[preset], manual_peers)))
 
-    with st.spinner("Assembling WDI CSV (current goal selection)…"):
-        frames: List[pd.DataFrame] = []
-        for cfg in ind_cfgs:
-            code = (cfg.get("code") or "").strip()
-            if not code:
-                continue
-            df_i = wb_fetch(code, countries)
-            df_i = df_i[(df_i["date"] >= yr1) & (df_i["date"] <= yr2)]
-            df_i["indicator_name"] = cfg["name"]
-            frames.append(df_i)
-        combined = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    # CSV is built only on request (not on every rerun) and kept in session state for this selection
+    sel_key = (goal, tuple(countries), yr1, yr2)
+    if st.button("Prepare WDI CSV (current selection)"):
+        with st.spinner("Assembling WDI CSV (current goal selection)…"):
+            csv_bytes = wdi_csv_bytes(goal, tuple(countries), yr1, yr2)
+        if not csv_bytes:
+            st.session_state.pop("wdi_csv", None)
+            st.info("No WDI data to download for this selection.")
+        else:
+            st.session_state["wdi_csv"] = (sel_key, csv_bytes)
 
-    if combined.empty:
-        st.info("No WDI data to download for this selection.")
-    else:
-        csv_bytes = combined.sort_values(["indicator","country","date"]).to_csv(index=False).encode("utf-8")
+    prepared = st.session_state.get("wdi_csv")
+    if prepared and prepared[0] == sel_key:
         st.download_button(
             "Download current selection (WDI CSV)",
-            data=csv_bytes,
+            data=prepared[1],
             file_name=f"sdg_wdi_{goal.replace(' ','_')}_{yr1}_{yr2}.csv",
             mime="text/csv",
         )